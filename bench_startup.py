@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Startup-time benchmark for scraper.py.
+
+Imports the scraper in fresh interpreters and reports the median cold import time.
+Fails (exit code 1) if the import exceeds the budget or pulls in a heavy dependency
+that should only be loaded on first use.
+
+Usage: python bench_startup.py [runs] [budget_ms]
+"""
+import os
+import sys
+import json
+import subprocess
+import statistics
+
+HEAVY_MODULES = ["playwright", "pymongo", "google.genai", "PIL", "numpy"]
+
+PROBE = f"""
+import sys, time, json
+start = time.perf_counter()
+import scraper
+elapsed = (time.perf_counter() - start) * 1000.0
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"ms": elapsed, "loaded": loaded}}))
+"""
+
+def measure_once():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 500.0
+
+    samples = [measure_once() for _ in range(runs)]
+    median_ms = statistics.median(s["ms"] for s in samples)
+    loaded = sorted({m for s in samples for m in s["loaded"]})
+
+    print(f"scraper import: median {median_ms:.1f}ms over {runs} runs (budget {budget_ms:.0f}ms)")
+    if loaded:
+        print(f"Heavy modules loaded at import time: {', '.join(loaded)}")
+
+    if median_ms > budget_ms or loaded:
+        print("STARTUP REGRESSION")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
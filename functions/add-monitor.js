@@ -7,7 +7,7 @@ exports.handler = async (event, context) => {
 
     try {
         const data = JSON.parse(event.body);
-        const { user_email, url, ai_focus_note, trigger_mode_enabled, visual_mode_enabled, custom_webhook_url, deep_crawl, deep_crawl_depth, check_frequency, requires_login, has_captcha, username, password, captcha_json, email_notifications_enabled, telegram_notifications_enabled, telegram_chat_id } = data;
+        const { user_email, url, ai_focus_note, trigger_mode_enabled, visual_mode_enabled, custom_webhook_url, deep_crawl, deep_crawl_depth, check_frequency, requires_login, has_captcha, username, password, captcha_json, email_notifications_enabled, telegram_notifications_enabled, telegram_chat_id, ignore_patterns, normalization_enabled, mask_large_numbers, adaptive_frequency_enabled, min_check_frequency, max_check_frequency, incremental_crawl_enabled } = data;
 
         if (!user_email || !url) {
             return { statusCode: 400, body: JSON.stringify({ error: 'Missing required fields' }) };
@@ -32,6 +32,17 @@ exports.handler = async (event, context) => {
         let frequency = parseInt(check_frequency, 10);
         if (isNaN(frequency) || frequency < 15) frequency = 1440; // Default to Daily if invalid
 
+        // Bounds for adaptive scheduling (minutes), never below the 15 minute cron resolution
+        let minFrequency = parseInt(min_check_frequency, 10);
+        if (isNaN(minFrequency) || minFrequency < 15) minFrequency = 15;
+        let maxFrequency = parseInt(max_check_frequency, 10);
+        if (isNaN(maxFrequency) || maxFrequency < minFrequency) maxFrequency = Math.max(10080, minFrequency);
+
+        // Custom regexes for volatile content the scraper should ignore (array or newline separated string)
+        const patterns = Array.isArray(ignore_patterns)
+            ? ignore_patterns.filter(p => typeof p === 'string' && p.trim())
+            : (ignore_patterns || '').split('\n').map(p => p.trim()).filter(Boolean);
+
         const newMonitor = {
             user_email,
             url,
@@ -41,6 +52,7 @@ exports.handler = async (event, context) => {
             custom_webhook_url: custom_webhook_url || '',
             deep_crawl: !!deep_crawl,
             deep_crawl_depth: depth,
+            incremental_crawl_enabled: !!incremental_crawl_enabled,
             check_frequency: frequency,
             requires_login: !!requires_login,
             has_captcha: !!has_captcha,
@@ -50,6 +62,12 @@ exports.handler = async (event, context) => {
             email_notifications_enabled: !!email_notifications_enabled,
             telegram_notifications_enabled: !!telegram_notifications_enabled,
             telegram_chat_id: telegram_chat_id || '',
+            ignore_patterns: patterns,
+            normalization_enabled: normalization_enabled !== false,
+            mask_large_numbers: !!mask_large_numbers,
+            adaptive_frequency_enabled: !!adaptive_frequency_enabled,
+            min_check_frequency: minFrequency,
+            max_check_frequency: maxFrequency,
             last_scraped_text: '',
             latest_ai_summary: 'Waiting for the first scan...',
             is_first_run: true,
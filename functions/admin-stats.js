@@ -25,7 +25,7 @@ exports.handler = async (event, context) => {
 
         monitors.forEach(m => {
             if (m.user_email) uniqueUsers.add(m.user_email);
-            if (m.last_run_status === 'failed') totalFailedRuns++;
+            if (m.last_run_status === 'failed' || m.last_run_status === 'stuck') totalFailedRuns++;
         });
 
         const stats = {
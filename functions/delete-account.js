@@ -24,6 +24,10 @@ exports.handler = async (event, context) => {
         const db = await getDb();
         const collection = db.collection('monitors');
 
+        // Remove cached deep crawl pages belonging to the account's monitors
+        const monitorIds = await collection.find({ user_email: target_email }, { projection: { _id: 1 } }).map(m => m._id).toArray();
+        await db.collection('crawl_pages').deleteMany({ monitor_id: { $in: monitorIds } });
+
         const result = await collection.deleteMany({ user_email: target_email });
 
         return {
@@ -26,6 +26,9 @@ exports.handler = async (event, context) => {
             return { statusCode: 404, body: JSON.stringify({ error: 'Monitor not found or unauthorized' }) };
         }
 
+        // Remove cached deep crawl pages for this monitor
+        await db.collection('crawl_pages').deleteMany({ monitor_id: new ObjectId(id) });
+
         return {
             statusCode: 200,
             body: JSON.stringify({ message: 'Monitor deleted successfully' }),
@@ -8,7 +8,7 @@ exports.handler = async (event, context) => {
 
     try {
         const data = JSON.parse(event.body);
-        const { id, user_email, url, ai_focus_note, trigger_mode_enabled, visual_mode_enabled, custom_webhook_url, deep_crawl, deep_crawl_depth, check_frequency, requires_login, has_captcha, username, password, captcha_json, email_notifications_enabled, telegram_notifications_enabled, telegram_chat_id } = data;
+        const { id, user_email, url, ai_focus_note, trigger_mode_enabled, visual_mode_enabled, custom_webhook_url, deep_crawl, deep_crawl_depth, check_frequency, requires_login, has_captcha, username, password, captcha_json, email_notifications_enabled, telegram_notifications_enabled, telegram_chat_id, ignore_patterns, normalization_enabled, mask_large_numbers, adaptive_frequency_enabled, min_check_frequency, max_check_frequency, incremental_crawl_enabled } = data;
 
         if (!id || !user_email || !url) {
             return { statusCode: 400, body: JSON.stringify({ error: 'Missing required fields' }) };
@@ -24,9 +24,40 @@ exports.handler = async (event, context) => {
         let frequency = parseInt(check_frequency, 10);
         if (isNaN(frequency) || frequency < 15) frequency = 1440;
 
+        // Bounds for adaptive scheduling (minutes), never below the 15 minute cron resolution
+        let minFrequency = parseInt(min_check_frequency, 10);
+        if (isNaN(minFrequency) || minFrequency < 15) minFrequency = 15;
+        let maxFrequency = parseInt(max_check_frequency, 10);
+        if (isNaN(maxFrequency) || maxFrequency < minFrequency) maxFrequency = Math.max(10080, minFrequency);
+
+        // Custom regexes for volatile content the scraper should ignore (array or newline separated string)
+        const patterns = Array.isArray(ignore_patterns)
+            ? ignore_patterns.filter(p => typeof p === 'string' && p.trim())
+            : (ignore_patterns || '').split('\n').map(p => p.trim()).filter(Boolean);
+
         // Ensure we only update a monitor belonging to the requested user
+        const existing = await collection.findOne({ _id: new ObjectId(id), user_email: user_email });
+        if (!existing) {
+            return { statusCode: 404, body: JSON.stringify({ error: 'Monitor not found or unauthorized' }) };
+        }
+
+        // A learned interval only holds for the frequency and bounds it was learned under
+        const unset = {};
+        if (frequency !== existing.check_frequency
+            || (min_check_frequency !== undefined && minFrequency !== existing.min_check_frequency)
+            || (max_check_frequency !== undefined && maxFrequency !== existing.max_check_frequency)) {
+            unset.adaptive_interval = '';
+            unset.adaptive_stats = '';
+        }
+        // The incremental crawl frontier belongs to the old site
+        const urlChanged = url !== existing.url;
+        if (urlChanged) {
+            unset.crawl_frontier = '';
+            unset.crawl_sample_cursor = '';
+        }
+
         const result = await collection.updateOne(
-            { _id: new ObjectId(id), user_email: user_email },
+            { _id: existing._id, user_email: user_email },
             {
                 $set: {
                     url,
@@ -45,8 +76,20 @@ exports.handler = async (event, context) => {
                     email_notifications_enabled: !!email_notifications_enabled,
                     telegram_notifications_enabled: !!telegram_notifications_enabled,
                     telegram_chat_id: telegram_chat_id || '',
+                    // Only overwrite normalization settings when the client actually sends them
+                    ...(ignore_patterns !== undefined && { ignore_patterns: patterns }),
+                    ...(normalization_enabled !== undefined && { normalization_enabled: normalization_enabled !== false }),
+                    ...(mask_large_numbers !== undefined && { mask_large_numbers: !!mask_large_numbers }),
+                    ...(adaptive_frequency_enabled !== undefined && { adaptive_frequency_enabled: !!adaptive_frequency_enabled }),
+                    ...(min_check_frequency !== undefined && { min_check_frequency: minFrequency }),
+                    ...(max_check_frequency !== undefined && { max_check_frequency: maxFrequency }),
+                    ...(incremental_crawl_enabled !== undefined && { incremental_crawl_enabled: !!incremental_crawl_enabled }),
+                    // Settings changed, so give a monitor stuck on the run deadline another chance
+                    is_stuck: false,
+                    consecutive_cancellations: 0,
                     last_updated_timestamp: new Date()
-                }
+                },
+                ...(Object.keys(unset).length > 0 && { $unset: unset })
             }
         );
 
@@ -54,6 +97,10 @@ exports.handler = async (event, context) => {
             return { statusCode: 404, body: JSON.stringify({ error: 'Monitor not found or unauthorized' }) };
         }
 
+        if (urlChanged) {
+            await db.collection('crawl_pages').deleteMany({ monitor_id: existing._id });
+        }
+
         return {
             statusCode: 200,
             body: JSON.stringify({ message: 'Monitor updated successfully' }),
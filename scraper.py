@@ -3,15 +3,18 @@ import os
 import json
 import asyncio
 import datetime
+import math
+import time
 import requests
 import difflib
+import re
+import hashlib
+import xml.etree.ElementTree as ET
 from urllib.parse import urlparse, urljoin
-from pymongo import MongoClient
-from playwright.async_api import async_playwright
-from google import genai
 from dotenv import load_dotenv
-from PIL import Image
-import numpy as np
+
+# Heavy dependencies (pymongo, playwright, google-genai, Pillow, numpy) are imported on first use
+# so short-lived cron runs with nothing due, and scripts importing summarize_changes, start fast.
 
 load_dotenv()
 
@@ -22,9 +25,161 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
 NETLIFY_URL = os.getenv("NETLIFY_URL", "http://localhost:8888").strip() # Default for local dev
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
+# Overall time limit for one worker run in minutes (0 disables the budget and runs every due monitor)
+RUN_BUDGET_MINUTES = float(os.getenv("RUN_BUDGET_MINUTES", "0").strip() or 0)
+# Optional epoch seconds when the surrounding job started, so setup time (dependency installs) counts against the budget
+RUN_STARTED_AT = float(os.getenv("RUN_STARTED_AT", "0").strip() or 0)
+# Limit concurrent browser tabs to 4 for github runner memory stability
+MAX_CONCURRENT_MONITORS = 4
+# Max number of small AI evaluations packed into one Gemini request (1 disables batching)
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "4").strip() or 1)
+
+# AI Setup (built lazily on the first Gemini call)
+_ai_client = None
+
+def get_ai_client():
+    global _ai_client
+    if _ai_client is None:
+        from google import genai
+        _ai_client = genai.Client(api_key=GEMINI_API_KEY)
+    return _ai_client
+
+# --- Batched AI Evaluation ---
+# How long the first pending evaluation waits for others to join its batch
+AI_BATCH_WINDOW_SECONDS = 3.0
+# Only short, image-free evaluations are batched; larger ones keep their own request
+AI_BATCH_MAX_ITEM_CHARS = 8000
+
+BATCH_PROMPT = """
+You are evaluating several independent webpage monitoring tasks at once. Each item has an "id" and a "type".
+
+- type "trigger": decide if the TRIGGER CONDITION in "condition" has been met by "page_text".
+  If YES, the result must start EXACTLY with "TRUE", followed by a new line and a very brief 1-sentence explanation of what you found.
+  If NO, the result must be EXACTLY "FALSE".
+- type "diff": "diff" is a text diff between an old and a new version of a webpage. Lines starting with '- ' were removed, and lines starting with '+ ' were added.
+  Summarize the significant changes in 2-3 concise bullet points. If "focus_note" is set, prioritize it and judge significance based ONLY on that note.
+  If the changes are only minor (like timestamps, ads, UI state changes, or random numbers), the result must be exactly "No significant changes".
+
+Evaluate every item on its own. Reply with a JSON array containing one object per item: {"id": "<item id>", "result": "<your answer>"}.
+
+ITEMS:
+"""
+
+# Forces Gemini to answer with exactly one {id, result} object per batched item
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "STRING"},
+            "result": {"type": "STRING"}
+        },
+        "required": ["id", "result"]
+    }
+}
+
+class GeminiBatcher:
+    """
+    Collects AI evaluations submitted by concurrently running monitors and sends them
+    as a single structured-output request. Batches never mix accounts: items are grouped
+    by batch key (the monitor's user_email), so one user's page content never shares a prompt
+    with another's. Items the batch could not answer resolve to None, which tells the caller
+    to fall back to its own single request.
+    """
+
+    def __init__(self, max_batch_size=AI_BATCH_SIZE, window_seconds=AI_BATCH_WINDOW_SECONDS):
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_seconds
+        self.pending = {}
+        self.timers = {}
+        # Strong references to in-flight flushes so they are not garbage collected mid-request
+        self.flush_tasks = set()
+        self.next_id = 0
+
+    async def submit(self, batch_key, item):
+        future = asyncio.get_running_loop().create_future()
+        self.next_id += 1
+        pending = self.pending.setdefault(batch_key, [])
+        pending.append((dict(item, id=f"item{self.next_id}"), future))
+
+        if len(pending) >= self.max_batch_size:
+            self.flush_now(batch_key)
+        elif batch_key not in self.timers:
+            self.timers[batch_key] = self.start_flush(self.flush_after_window(batch_key))
+
+        return await future
+
+    def start_flush(self, coro):
+        task = asyncio.create_task(coro)
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+        return task
+
+    async def flush_after_window(self, batch_key):
+        await asyncio.sleep(self.window_seconds)
+        self.timers.pop(batch_key, None)
+        await self.flush(self.take_pending(batch_key))
+
+    def flush_now(self, batch_key):
+        timer = self.timers.pop(batch_key, None)
+        if timer is not None:
+            timer.cancel()
+        self.start_flush(self.flush(self.take_pending(batch_key)))
+
+    def take_pending(self, batch_key):
+        batch = self.pending.pop(batch_key, [])
+        # Drop evaluations whose monitor was cancelled while waiting
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def flush(self, batch):
+        results = {}
+        # A lone item gains nothing from batching, so let it take the normal single-call path
+        if len(batch) > 1:
+            print(f"Sending {len(batch)} AI evaluations in one batched Gemini request")
+            results = await self.request_batch([item for item, _ in batch])
+
+        for item, future in batch:
+            if not future.done():
+                future.set_result(results.get(item["id"]))
+
+    async def request_batch(self, items):
+        prompt = BATCH_PROMPT + json.dumps(items, ensure_ascii=False, indent=1)
+        try:
+            await asyncio.sleep(2)
+            response = get_ai_client().models.generate_content(
+                model='gemini-2.5-flash',
+                contents=[prompt],
+                config={"response_mime_type": "application/json", "response_schema": BATCH_RESPONSE_SCHEMA}
+            )
+            parsed = json.loads(response.text)
+            if not isinstance(parsed, list):
+                raise ValueError("response is not a JSON array")
+            return {
+                str(entry["id"]): str(entry["result"]).strip()
+                for entry in parsed
+                if isinstance(entry, dict) and "id" in entry and entry.get("result")
+            }
+        except Exception as e:
+            print(f"Batched Gemini request failed, falling back to single calls: {e}")
+            return {}
 
-# AI Setup
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Active only while run_worker is processing monitors
+_ai_batcher = None
+
+def can_batch(text, image_path, batch_key):
+    return (
+        _ai_batcher is not None
+        and batch_key
+        and not (image_path and os.path.exists(image_path))
+        and len(text) <= AI_BATCH_MAX_ITEM_CHARS
+    )
+
+def parse_trigger_result(result_text):
+    if result_text.startswith("TRUE"):
+        # Strip the "TRUE" to leave just the explanation
+        explanation = result_text[4:].strip()
+        return f"🎯 SNIPER TRIGGER MET: {explanation}"
+    return "TRIGGER_NOT_MET"
 
 async def trigger_notifications(monitor_doc, summary, image_path=None):
     notify_url = f"{NETLIFY_URL}/.netlify/functions/notify"
@@ -125,6 +280,9 @@ def compare_images(img_path1, img_path2):
     try:
         if not os.path.exists(img_path1) or not os.path.exists(img_path2):
             return 100.0 # Treat missing old image as 100% changed
+
+        from PIL import Image
+        import numpy as np
             
         i1 = Image.open(img_path1).convert('RGB')
         i2 = Image.open(img_path2).convert('RGB')
@@ -154,10 +312,326 @@ def compare_images(img_path1, img_path2):
          print(f"Image Compare Error: {e}")
          return 0.0 # Safety fallback
 
-async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_enabled=False, image_path=None):
+# --- Volatile Content Normalization ---
+# Currency markers. Numbers next to these are never treated as volatile counters,
+# and lines containing them are never learned as volatile, so price watches keep working.
+CURRENCY_RE = re.compile(r'[$€£¥₹]|\b(?:USD|EUR|GBP|EGP|SAR|AED|KWD|QAR|BHD|OMR|JOD|JPY|CNY|INR|CAD|AUD|CHF|TRY|RUB|BRL|MXN)\b')
+
+DAY = r'(?:0?[1-9]|[12]\d|3[01])'
+MONTH = r'(?:0?[1-9]|1[0-2])'
+
+# Built-in masks for content that changes on nearly every load (clocks, tokens).
+# Each match is replaced by a stable placeholder so it never registers as a change.
+BUILTIN_VOLATILE_RULES = [
+    # ISO timestamps: 2024-05-01, 2024-05-01T12:30:00Z
+    (re.compile(rf'\b\d{{4}}-{MONTH}-{DAY}(?:[T ]\d{{2}}:\d{{2}}(?::\d{{2}})?(?:\.\d+)?(?:Z|[+-]\d{{2}}:?\d{{2}})?)?\b'), '[DATE]'),
+    # Numeric dates: 05/01/2024, 5/1/24, 01.05.2024, 01-05-2024 (dotted/dashed dates need a 4 digit year so versions like 10.11.12 survive)
+    (re.compile(rf'(?<![\d.])(?:{DAY}/{DAY}/(?:\d{{4}}|\d{{2}})|{DAY}([.-]){DAY}\1\d{{4}})(?![.\d])'), '[DATE]'),
+    # Written dates: May 1, 2024 / 1 May 2024
+    (re.compile(r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b', re.IGNORECASE), '[DATE]'),
+    (re.compile(r'\b\d{1,2}(?:st|nd|rd|th)?\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?,?\s+\d{4}\b', re.IGNORECASE), '[DATE]'),
+    # Clock times: 12:30, 12:30:45, 9:05 PM
+    (re.compile(r'(?<![\d:.])(?:[01]?\d|2[0-3]):[0-5]\d(?::[0-5]\d)?(?:\s?[AaPp]\.?[Mm]\.?)?(?![\w:])'), '[TIME]'),
+    # Relative times: "5 minutes ago", "an hour ago", "just now"
+    (re.compile(r'\b(?:\d+|an?|one)\s+(?:sec(?:ond)?|min(?:ute)?|hour|hr|day|week|month|year)s?\s+ago\b', re.IGNORECASE), '[RELATIVE_TIME]'),
+    (re.compile(r'\bjust now\b', re.IGNORECASE), '[RELATIVE_TIME]'),
+    # UUIDs and long hex tokens (CSRF/session/cache-busting ids)
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '[UUID]'),
+    (re.compile(r'\b[0-9a-fA-F]{32,}\b'), '[TOKEN]'),
+]
+
+def mask_counter(match):
+    # Leave amounts alone when a currency symbol or code sits on either side
+    text = match.string
+    before = text[max(0, match.start() - 4):match.start()]
+    after = text[match.end():match.end() + 4]
+    if CURRENCY_RE.search(before) or CURRENCY_RE.search(after):
+        return match.group(0)
+    return '[NUMBER]'
+
+# Large counters (views, likes, visitors). Opt-in per monitor via `mask_large_numbers`,
+# since stock levels and unlabelled prices look exactly the same.
+COUNTER_RULES = [
+    (re.compile(r'(?<![\d.,])\b\d{1,3}(?:,\d{3})+\b(?![.,]\d)'), mask_counter),
+    (re.compile(r'(?<![\d.,])\b\d{5,}\b(?![.,]\d)'), mask_counter),
+]
+
+VOLATILE_PLACEHOLDER = '[VOLATILE]'
+# How many consecutive insignificant runs a line must flip before it is masked automatically
+VOLATILE_LEARN_THRESHOLD = 3
+DIGITS_RE = re.compile(r'\d+')
+
+def compile_custom_rules(monitor_doc):
+    """
+    Compiles the monitor's `ignore_patterns` (list or newline separated string of regexes).
+    Invalid patterns are reported and skipped rather than failing the whole run.
+    """
+    raw_patterns = monitor_doc.get('ignore_patterns') or []
+    if isinstance(raw_patterns, str):
+        raw_patterns = raw_patterns.splitlines()
+
+    rules = []
+    for pattern in raw_patterns:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        try:
+            rules.append((re.compile(pattern), VOLATILE_PLACEHOLDER))
+        except re.error as e:
+            print(f"Ignoring invalid custom pattern '{pattern}' for {monitor_doc.get('url')}: {e}")
+    return rules
+
+def line_shape_key(line):
+    """
+    Stable short key for a line's shape: its masked text with every digit run abstracted,
+    so "Online now: 347" and "Online now: 352" share a key.
+    """
+    return hashlib.sha1(DIGITS_RE.sub('#', line).encode('utf-8')).hexdigest()[:16]
+
+def normalize_line_pairs(text, custom_rules=None, learned_shapes=None, use_builtin_rules=True, mask_numbers=False):
+    """
+    Masks volatile content line by line so cosmetic churn never reaches change detection.
+    Lines whose shape was learned as volatile are replaced with a placeholder.
+    Returns (raw_line, normalized_line) pairs so callers can map changes back to the real text.
+    """
+    if not text:
+        return []
+
+    rules = (BUILTIN_VOLATILE_RULES if use_builtin_rules else []) + (COUNTER_RULES if mask_numbers else []) + (custom_rules or [])
+    learned_shapes = set(learned_shapes or [])
+
+    pairs = []
+    for raw_line in text.splitlines():
+        raw_line = " ".join(raw_line.split())
+        if not raw_line:
+            continue
+        line = raw_line
+        for pattern, placeholder in rules:
+            line = pattern.sub(placeholder, line)
+        if learned_shapes and line_shape_key(line) in learned_shapes:
+            line = VOLATILE_PLACEHOLDER
+        pairs.append((raw_line, line))
+
+    return pairs
+
+def normalize_text(text, **options):
+    return "\n".join(line for _, line in normalize_line_pairs(text, **options))
+
+def monitor_normalize_options(monitor_doc):
+    return {
+        "custom_rules": compile_custom_rules(monitor_doc),
+        "learned_shapes": monitor_doc.get('learned_volatile_shapes', []),
+        "use_builtin_rules": monitor_doc.get('normalization_enabled', True),
+        "mask_numbers": monitor_doc.get('mask_large_numbers', False)
+    }
+
+def normalize_for_monitor(text, monitor_doc):
+    return normalize_text(text, **monitor_normalize_options(monitor_doc))
+
+def raw_changed_lines(old_text, new_text, monitor_doc):
+    """
+    Diffs the normalized lines but returns the raw text of the changed ones as (old, new),
+    so the AI summarizes real values instead of placeholders while volatile-only lines stay out.
+    """
+    options = monitor_normalize_options(monitor_doc)
+    old_pairs = normalize_line_pairs(old_text, **options)
+    new_pairs = normalize_line_pairs(new_text, **options)
+    matcher = difflib.SequenceMatcher(None, [n for _, n in old_pairs], [n for _, n in new_pairs], autojunk=False)
+
+    old_changed, new_changed = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        old_changed.extend(raw for raw, _ in old_pairs[i1:i2])
+        new_changed.extend(raw for raw, _ in new_pairs[j1:j2])
+    return "\n".join(old_changed), "\n".join(new_changed)
+
+def has_meaningful_change(old_normalized, new_normalized):
+    # Whitespace-insensitive so older single-line baselines compare cleanly against line-preserving scrapes
+    return " ".join(old_normalized.split()) != " ".join(new_normalized.split())
+
+def line_fingerprints(normalized_text):
+    """
+    Maps each learnable line shape to a hash of its current content.
+    Only lines with digits can flip while keeping their shape, and lines mentioning
+    a currency are never learnable.
+    """
+    shapes = {}
+    for line in normalized_text.splitlines():
+        if not DIGITS_RE.search(line) or CURRENCY_RE.search(line):
+            continue
+        shapes.setdefault(line_shape_key(line), []).append(line)
+    return {
+        key: hashlib.sha1("\n".join(lines).encode('utf-8')).hexdigest()[:16]
+        for key, lines in shapes.items()
+    }
+
+def learn_volatile_lines(monitor_doc, new_normalized, significant):
+    """
+    Compares line fingerprints against the previous scrape (not the stored baseline, which only
+    moves on significant changes). A shape that changed content on VOLATILE_LEARN_THRESHOLD
+    consecutive insignificant runs is learned as volatile.
+    Returns the fields to $set on the monitor document.
+    """
+    previous = monitor_doc.get('line_fingerprints') or {}
+    previous_stats = monitor_doc.get('volatile_line_stats') or {}
+    learned = list(monitor_doc.get('learned_volatile_shapes') or [])
+    current = line_fingerprints(new_normalized)
+
+    # Shapes that did not flip this run drop out, so only lines that change on every run get learned.
+    # A significant change resets all counts.
+    stats = {}
+    if not significant:
+        for key, content_hash in current.items():
+            if key not in previous or previous[key] == content_hash:
+                continue
+            count = previous_stats.get(key, 0) + 1
+            if count >= VOLATILE_LEARN_THRESHOLD:
+                if key not in learned:
+                    learned.append(key)
+                    print(f"Learned a new volatile line for {monitor_doc['url']}")
+            else:
+                stats[key] = count
+
+    return {
+        "line_fingerprints": current,
+        "volatile_line_stats": stats,
+        "learned_volatile_shapes": learned
+    }
+
+# --- Adaptive Scheduling ---
+# Decay applied to past observations on every run (exponential moving average of the Poisson rate)
+ADAPTIVE_DECAY = 0.8
+DEFAULT_MIN_FREQUENCY = 15 # minutes
+DEFAULT_MAX_FREQUENCY = 10080 # weekly
+
+def get_frequency_bounds(monitor_doc):
+    min_freq = max(DEFAULT_MIN_FREQUENCY, monitor_doc.get('min_check_frequency') or DEFAULT_MIN_FREQUENCY)
+    max_freq = max(min_freq, monitor_doc.get('max_check_frequency') or DEFAULT_MAX_FREQUENCY)
+    return min_freq, max_freq
+
+def get_effective_frequency(monitor_doc):
+    """Returns the interval in minutes the monitor should currently be checked at."""
+    check_frequency = monitor_doc.get('check_frequency', 1440) # Default to daily
+    if not monitor_doc.get('adaptive_frequency_enabled'):
+        return check_frequency
+
+    min_freq, max_freq = get_frequency_bounds(monitor_doc)
+    interval = min(max_freq, max(min_freq, monitor_doc.get('adaptive_interval') or check_frequency))
+    failures = monitor_doc.get('consecutive_failures', 0)
+    if failures:
+        # Exponential backoff from the normal interval, so failing monitors are never polled more often than healthy ones
+        return min(max_freq, interval * 2 ** (failures - 1))
+
+    return interval
+
+def minutes_since_due(monitor_doc, now=None):
+    """
+    Returns how many minutes past its due time the monitor is (negative if not due yet),
+    along with the effective frequency and the minutes passed since its last check.
+    """
+    now = now or datetime.datetime.now()
+    frequency = get_effective_frequency(monitor_doc)
+
+    reference = monitor_doc.get('last_updated_timestamp')
+    if monitor_doc.get('adaptive_frequency_enabled') and monitor_doc.get('consecutive_failures'):
+        reference = monitor_doc.get('last_error_time') or reference
+
+    if not reference:
+        return float('inf'), frequency, None
+
+    minutes_passed = (now - reference).total_seconds() / 60.0
+    return minutes_passed - frequency, frequency, minutes_passed
+
+def is_monitor_due(monitor_doc, now=None):
+    overdue, _, _ = minutes_since_due(monitor_doc, now)
+    # 5-minute grace period to account for cron jitter
+    return overdue >= -5
+
+def update_adaptive_schedule(monitor_doc, normalized_text, now=None):
+    """
+    Records a change/no-change observation and re-estimates the monitor's change rate.
+    A check only reveals whether the page changed at least once since the last one, so the rate
+    uses the Poisson estimator lambda = -ln((n - X + 0.5) / (n + 0.5)) / I over decayed counts of
+    checks (n), checks that saw a change (X) and the mean check interval (I). The next interval is
+    when a change becomes more likely than not (ln 2 / lambda), clamped to the user's min/max bounds.
+    Returns the fields to $set on the monitor document.
+    """
+    now = now or datetime.datetime.now()
+    content_hash = hashlib.sha1(normalized_text.encode('utf-8')).hexdigest()
+    previous_hash = monitor_doc.get('last_content_hash')
+    fields = {"last_content_hash": content_hash}
+
+    # Nothing to compare against on the first observation
+    if not monitor_doc.get('adaptive_frequency_enabled') or previous_hash is None:
+        return fields
+
+    last_checked = monitor_doc.get('last_updated_timestamp')
+    elapsed = (now - last_checked).total_seconds() / 60.0 if last_checked else 0.0
+    changed = previous_hash != content_hash
+
+    check_frequency = monitor_doc.get('check_frequency', 1440)
+    # Prior worth two checks at the user-chosen frequency, calibrated so new monitors start at that interval
+    stats = monitor_doc.get('adaptive_stats') or {"checks": 2.0, "changes": 1.25, "observed_minutes": 2.0 * check_frequency}
+    checks = stats["checks"] * ADAPTIVE_DECAY + 1.0
+    changes = stats["changes"] * ADAPTIVE_DECAY + (1.0 if changed else 0.0)
+    observed_minutes = stats["observed_minutes"] * ADAPTIVE_DECAY + max(elapsed, 0.0)
+
+    min_freq, max_freq = get_frequency_bounds(monitor_doc)
+    mean_interval = observed_minutes / checks
+    rate = -math.log((checks - changes + 0.5) / (checks + 0.5)) / mean_interval if mean_interval > 0 else 0.0
+    interval = math.log(2) / rate if rate > 0 else max_freq
+    interval = min(max_freq, max(min_freq, interval))
+
+    print(f"Adaptive schedule for {monitor_doc['url']}: changed={changed}, next interval {interval:.0f}m")
+    fields.update({
+        "adaptive_stats": {"checks": checks, "changes": changes, "observed_minutes": observed_minutes},
+        "adaptive_interval": interval
+    })
+    return fields
+
+# --- Run Budget ---
+# Cost estimate used for monitors that have never completed a run
+DEFAULT_RUN_ESTIMATE_SECONDS = 60.0
+RUN_DURATION_DECAY = 0.7
+# Time cancelled checks get to close their browser contexts and record state; reserved inside the budget
+CANCEL_GRACE_SECONDS = 30
+# Consecutive deadline cancellations after which a monitor is marked stuck and left out of budgeted runs
+MAX_CONSECUTIVE_CANCELLATIONS = 3
+
+def estimate_run_seconds(monitor_doc):
+    """Expected wall time for one check, learned from previous runs."""
+    estimate = monitor_doc.get('avg_run_seconds')
+    if estimate:
+        return estimate
+    # Unknown monitors: assume deep crawls cost roughly one page load per level
+    depth = monitor_doc.get('deep_crawl_depth', 1) if monitor_doc.get('deep_crawl') else 1
+    return DEFAULT_RUN_ESTIMATE_SECONDS * depth
+
+def record_run_duration(monitor_doc, seconds, partial=False):
+    """
+    Returns the fields to $set with the updated moving average of run time.
+    Partial (cancelled) runs only ever raise the estimate, since the true cost was higher.
+    """
+    previous = monitor_doc.get('avg_run_seconds')
+    if partial:
+        average = max(previous or 0.0, seconds)
+    elif previous:
+        average = previous * RUN_DURATION_DECAY + seconds * (1 - RUN_DURATION_DECAY)
+    else:
+        average = seconds
+    return {"avg_run_seconds": average, "last_run_seconds": seconds}
+
+async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_enabled=False, image_path=None, batch_key=None):
+    # batch_key (the monitor owner's user_email) opts the evaluation into batching with that user's other monitors
     # If Trigger Mode is enabled, we completely bypass diffing the old/new text.
     # We strictly evaluate the NEW text against the user's condition.
     if trigger_mode_enabled and ai_focus_note:
+        if can_batch(new_text, image_path, batch_key):
+            result_text = await _ai_batcher.submit(batch_key, {"type": "trigger", "condition": ai_focus_note, "page_text": new_text})
+            if result_text is not None:
+                return parse_trigger_result(result_text)
+
         prompt = f"""
         You are a highly analytical 'Sniper Bot'. Your job is to evaluate if a strictly defined Trigger Condition has been met on a webpage.
         
@@ -175,6 +649,7 @@ async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_e
         contents_payload = [prompt]
         if image_path and os.path.exists(image_path):
             try:
+                from PIL import Image
                 img = Image.open(image_path)
                 contents_payload.append(img)
             except Exception as e:
@@ -182,15 +657,8 @@ async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_e
                 
         try:
             await asyncio.sleep(2)
-            response = client.models.generate_content(model='gemini-2.5-flash', contents=contents_payload)
-            result_text = response.text.strip()
-            
-            if result_text.startswith("TRUE"):
-                # Strip the "TRUE" to leave just the explanation
-                explanation = result_text[4:].strip()
-                return f"🎯 SNIPER TRIGGER MET: {explanation}"
-            else:
-                return "TRIGGER_NOT_MET"
+            response = get_ai_client().models.generate_content(model='gemini-2.5-flash', contents=contents_payload)
+            return parse_trigger_result(response.text.strip())
                 
         except Exception as e:
             print(f"Gemini API Error (Sniper Mode): {e}")
@@ -212,6 +680,11 @@ async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_e
     if not diff_text.strip():
         return "No significant changes"
 
+    if can_batch(diff_text, image_path, batch_key):
+        result_text = await _ai_batcher.submit(batch_key, {"type": "diff", "focus_note": ai_focus_note, "diff": diff_text})
+        if result_text is not None:
+            return result_text
+
     focus_instruction = f"\n    The user has provided a specific focus note: '{ai_focus_note}'. Please prioritize this in your summary and evaluate if the change is significant based ONLY on this note." if ai_focus_note else ""
 
     prompt = f"""
@@ -227,6 +700,7 @@ async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_e
     contents_payload = [prompt]
     if image_path and os.path.exists(image_path):
         try:
+            from PIL import Image
             img = Image.open(image_path)
             contents_payload.append(img)
         except Exception as e:
@@ -234,7 +708,7 @@ async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_e
             
     try:
         await asyncio.sleep(2)
-        response = client.models.generate_content(
+        response = get_ai_client().models.generate_content(
             model='gemini-2.5-flash',
             contents=contents_payload,
         )
@@ -243,7 +717,7 @@ async def summarize_changes(old_text, new_text, ai_focus_note="", trigger_mode_e
         print(f"Gemini API Error: {e}")
         await asyncio.sleep(5)
         try:
-            response = client.models.generate_content(
+            response = get_ai_client().models.generate_content(
                 model='gemini-2.5-flash',
                 contents=contents_payload,
             )
@@ -261,17 +735,175 @@ async def extract_links(page, base_url):
     
     valid_links = set()
     for link in links:
-        parsed = urlparse(link)
-        # Check if same domain, exclude javascript/mailto, remove fragments
-        if parsed.netloc == domain and parsed.scheme in ['http', 'https']:
-            clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-            # optionally handle query params, but path is safer for basic crawl
-            if parsed.query:
-                clean_url += f"?{parsed.query}"
+        clean_url = clean_link(link, domain)
+        if clean_url:
             valid_links.add(clean_url)
             
     return sorted(list(valid_links))
 
+def clean_link(link, domain):
+    parsed = urlparse(link)
+    # Check if same domain, exclude javascript/mailto, remove fragments
+    if parsed.netloc != domain or parsed.scheme not in ['http', 'https']:
+        return None
+    clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+    # optionally handle query params, but path is safer for basic crawl
+    if parsed.query:
+        clean_url += f"?{parsed.query}"
+    return clean_url
+
+# --- Incremental Deep Crawl ---
+# Share of unchanged frontier pages re-rendered each run, so pages without a sitemap lastmod still get refreshed
+INCREMENTAL_SAMPLE_FRACTION = 0.2
+# Pages neither rendered, rediscovered as a link, nor listed in the sitemap for this many runs are dropped.
+# Must exceed 1 / INCREMENTAL_SAMPLE_FRACTION so pages only linked from sampled pages survive between samples.
+FRONTIER_MAX_MISSED_RUNS = 10
+# Upper bound on cached pages per monitor; new links beyond it are not crawled
+MAX_FRONTIER_PAGES = 200
+MAX_CHILD_SITEMAPS = 10
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+def fetch_sitemap_lastmods(start_url):
+    """
+    Reads /sitemap.xml (following one level of sitemap index) and returns {url: lastmod}
+    for same-domain entries. Returns an empty dict when no sitemap is available.
+    """
+    parsed = urlparse(start_url)
+    domain = parsed.netloc
+    pending = [f"{parsed.scheme}://{domain}/sitemap.xml"]
+    lastmods = {}
+    fetched = 0
+
+    while pending and fetched <= MAX_CHILD_SITEMAPS:
+        sitemap_url = pending.pop(0)
+        fetched += 1
+        try:
+            response = requests.get(sitemap_url, timeout=10)
+            if response.status_code != 200:
+                continue
+            root = ET.fromstring(response.content)
+        except Exception as e:
+            print(f"Could not read sitemap {sitemap_url}: {e}")
+            continue
+
+        # Sitemap index: queue child sitemaps
+        for loc in root.findall(f'{SITEMAP_NS}sitemap/{SITEMAP_NS}loc'):
+            if loc.text:
+                pending.append(loc.text.strip())
+
+        for entry in root.findall(f'{SITEMAP_NS}url'):
+            loc = entry.find(f'{SITEMAP_NS}loc')
+            lastmod = entry.find(f'{SITEMAP_NS}lastmod')
+            clean_url = clean_link(loc.text.strip(), domain) if loc is not None and loc.text else None
+            if clean_url:
+                lastmods[clean_url] = lastmod.text.strip() if lastmod is not None and lastmod.text else None
+
+    return lastmods
+
+def load_crawl_frontier(monitor_doc, start_url, max_depth):
+    """
+    Returns the stored frontier keyed by URL, keeping only pages on the start URL's host within
+    max_depth, so a monitor whose URL was edited never re-crawls the old site.
+    """
+    netloc = urlparse(start_url).netloc
+    return {
+        entry['url']: entry for entry in (monitor_doc.get('crawl_frontier') or [])
+        if entry.get('depth', 1) <= max_depth and urlparse(entry['url']).netloc == netloc
+    }
+
+def merge_crawl_frontier(frontier, rendered_urls, seen_urls, sitemap_lastmods, page_depths, max_depth, now):
+    """
+    Builds the next frontier from this run's results. Rendered pages are refreshed, skipped pages
+    count a missed run unless they were rediscovered as a link or listed in the sitemap, and pages
+    missed for FRONTIER_MAX_MISSED_RUNS runs in a row are dropped so removals reach the diff.
+    Returns (new_frontier, dropped_urls). Page text lives in the crawl_pages collection, not here.
+    """
+    new_frontier = []
+    dropped = []
+    for url in sorted(set(frontier) | set(rendered_urls)):
+        if url in rendered_urls:
+            new_frontier.append({
+                "url": url,
+                "depth": frontier[url]['depth'] if url in frontier else page_depths.get(url, max_depth),
+                "lastmod": sitemap_lastmods.get(url),
+                "last_rendered": now,
+                "missed_runs": 0
+            })
+            continue
+
+        entry = dict(frontier[url])
+        entry['missed_runs'] = 0 if (url in seen_urls or url in sitemap_lastmods) else entry.get('missed_runs', 0) + 1
+        if entry['missed_runs'] >= FRONTIER_MAX_MISSED_RUNS:
+            dropped.append(url)
+        else:
+            new_frontier.append(entry)
+
+    return new_frontier, dropped
+
+def select_urls_to_refresh(frontier, sitemap_lastmods, start_url, sample_cursor):
+    """
+    Picks the stored frontier pages that need re-rendering this run:
+    pages whose sitemap lastmod changed plus a rotating sample of the rest.
+    Returns (urls_to_refresh, next_sample_cursor).
+    """
+    refresh = set()
+    rest = []
+    for url in sorted(frontier):
+        if url == start_url:
+            continue
+        stored_lastmod = frontier[url].get('lastmod')
+        current_lastmod = sitemap_lastmods.get(url)
+        if current_lastmod and current_lastmod != stored_lastmod:
+            refresh.add(url)
+        else:
+            rest.append(url)
+
+    if rest:
+        sample_size = max(1, int(len(rest) * INCREMENTAL_SAMPLE_FRACTION))
+        start = sample_cursor % len(rest)
+        refresh.update((rest + rest)[start:start + sample_size])
+        sample_cursor = (start + sample_size) % len(rest)
+
+    return refresh, sample_cursor
+
+async def save_crawl_frontier(monitor_doc, monitors_col, frontier, all_text_blocks, seen_links, sitemap_lastmods, page_depths, max_depth, sample_cursor):
+    """
+    Persists the frontier metadata on the monitor and page text in the crawl_pages collection,
+    and fills all_text_blocks with the stored text of pages skipped this run.
+    Storage errors are reported without failing the scrape.
+    """
+    from pymongo import UpdateOne
+
+    pages_col = monitors_col.database.crawl_pages
+    monitor_id = monitor_doc["_id"]
+    rendered_urls = set(all_text_blocks)
+    new_frontier, dropped = merge_crawl_frontier(
+        frontier, rendered_urls, seen_links, sitemap_lastmods, page_depths, max_depth, datetime.datetime.now()
+    )
+    if dropped:
+        print(f"Dropping {len(dropped)} pages no longer linked or listed for {monitor_doc['url']}")
+
+    try:
+        if rendered_urls:
+            pages_col.bulk_write([
+                UpdateOne({"monitor_id": monitor_id, "url": url}, {"$set": {"text": all_text_blocks[url]}}, upsert=True)
+                for url in rendered_urls
+            ], ordered=False)
+
+        skipped_urls = [entry['url'] for entry in new_frontier if entry['url'] not in rendered_urls]
+        if skipped_urls:
+            for stored in pages_col.find({"monitor_id": monitor_id, "url": {"$in": skipped_urls}}):
+                all_text_blocks[stored['url']] = stored['text']
+
+        kept_urls = [entry['url'] for entry in new_frontier]
+        pages_col.delete_many({"monitor_id": monitor_id, "url": {"$nin": kept_urls}})
+        monitors_col.update_one(
+            {"_id": monitor_id},
+            {"$set": {"crawl_frontier": new_frontier, "crawl_sample_cursor": sample_cursor}}
+        )
+    except Exception as e:
+        print(f"Failed to save crawl frontier for {monitor_doc['url']}: {e}")
+
 async def scrape_monitor(context, monitor_doc, monitors_col, screenshot_path=None):
     start_url = monitor_doc['url']
     is_deep_crawl = monitor_doc.get('deep_crawl', False)
@@ -282,6 +914,23 @@ async def scrape_monitor(context, monitor_doc, monitors_col, screenshot_path=Non
     # Queue stores tuples of (URL, current_depth)
     queue = [(start_url, 1)]
     all_text_blocks = {}
+    page_depths = {start_url: 1}
+    # Every same-domain link seen on a rendered page, used to keep known pages alive in the frontier
+    seen_links = set()
+
+    # Incremental mode: reuse the stored frontier and only re-render new, modified or sampled pages
+    is_incremental = is_deep_crawl and max_depth > 1 and monitor_doc.get('incremental_crawl_enabled', False)
+    frontier = {}
+    refresh_urls = set()
+    sitemap_lastmods = {}
+    sample_cursor = monitor_doc.get('crawl_sample_cursor', 0)
+    if is_incremental:
+        frontier = load_crawl_frontier(monitor_doc, start_url, max_depth)
+        sitemap_lastmods = await asyncio.to_thread(fetch_sitemap_lastmods, start_url)
+        if frontier:
+            refresh_urls, sample_cursor = select_urls_to_refresh(frontier, sitemap_lastmods, start_url, sample_cursor)
+            queue.extend(sorted(((url, frontier[url]['depth']) for url in refresh_urls), key=lambda item: item[1]))
+            print(f"Incremental crawl: re-rendering {len(refresh_urls)} of {len(frontier)} known pages plus any new links")
     
     print(f"Starting Scrape for: {start_url} (Deep Crawl: {is_deep_crawl}, Max Depth: {max_depth})")
     
@@ -357,7 +1006,8 @@ async def scrape_monitor(context, monitor_doc, monitors_col, screenshot_path=Non
 
                 # Extract Text
                 content = await page.evaluate("() => document.body.innerText")
-                clean_text = " ".join(content.split())
+                # Collapse whitespace per line but keep line structure so diffs and volatile-line learning stay granular
+                clean_text = "\n".join(" ".join(line.split()) for line in content.splitlines() if line.strip())
                 all_text_blocks[current_url] = f"--- PAGE: {current_url} ---\n{clean_text}"
                 
                 # Take Optional Screenshot of the main page
@@ -372,14 +1022,25 @@ async def scrape_monitor(context, monitor_doc, monitors_col, screenshot_path=Non
                 # Extract Links if deep crawling AND we haven't reached max depth
                 if is_deep_crawl and current_depth < max_depth:
                     new_links = await extract_links(page, start_url)
+                    seen_links.update(new_links)
                     for link in new_links:
+                        # Known pages not selected for refresh keep their stored text
+                        if link in frontier and link not in refresh_urls:
+                            continue
+                        # Stop growing the frontier once it reaches its size cap
+                        if is_incremental and link not in frontier and len(frontier) + len(page_depths) > MAX_FRONTIER_PAGES:
+                            continue
                         # Only add if not visited and not already in queue (compare just the url part)
                         if link not in visited and not any(q_url == link for q_url, _ in queue):
                             queue.append((link, current_depth + 1))
+                            page_depths[link] = current_depth + 1
 
             except Exception as e:
                 print(f"    Error scraping sub-page {current_url}: {e}")
 
+        if is_incremental:
+            await save_crawl_frontier(monitor_doc, monitors_col, frontier, all_text_blocks, seen_links, sitemap_lastmods, page_depths, max_depth, sample_cursor)
+
         sorted_urls = sorted(all_text_blocks.keys())
         return "\n\n".join(all_text_blocks[url] for url in sorted_urls)
     
@@ -390,44 +1051,38 @@ async def scrape_monitor(context, monitor_doc, monitors_col, screenshot_path=Non
         await page.close()
 
 async def process_monitor(monitor, browser, monitors_col, semaphore):
-    async with semaphore:
-        # Check if Admin Paused this monitor
-        if monitor.get('is_paused', False):
-            print(f"Skipping {monitor['url']} (Paused by Admin)")
-            return
+    # Check if Admin Paused this monitor
+    if monitor.get('is_paused', False):
+        print(f"Skipping {monitor['url']} (Paused by Admin)")
+        return
+
+    # Check Custom (or Adaptive) Frequency
+    if not is_monitor_due(monitor):
+        _, check_frequency, minutes_passed = minutes_since_due(monitor)
+        print(f"Skipping {monitor['url']} (Not time yet. Freq: {check_frequency:.0f}m, Passed: {minutes_passed:.1f}m)")
+        return
+
+    run_started = time.monotonic()
 
-        # Check Custom Frequency
-        check_frequency = monitor.get('check_frequency', 1440) # Default to daily
-        last_updated = monitor.get('last_updated_timestamp')
+    # Set up Visual Mode paths
+    visual_mode_enabled = monitor.get('visual_mode_enabled', False)
+    screenshots_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
+    if visual_mode_enabled:
+        os.makedirs(screenshots_dir, exist_ok=True)
         
-        if last_updated:
-            now = datetime.datetime.now()
-            # Handle if the DB timestamp doesn't have timezone info and now() doesn't
-            time_diff = now - last_updated
-            minutes_passed = time_diff.total_seconds() / 60.0
-            
-            # 5-minute grace period to account for cron jitter
-            if minutes_passed < (check_frequency - 5):
-                print(f"Skipping {monitor['url']} (Not time yet. Freq: {check_frequency}m, Passed: {minutes_passed:.1f}m)")
-                return
-
-        # Set up Visual Mode paths
-        visual_mode_enabled = monitor.get('visual_mode_enabled', False)
-        screenshots_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
-        if visual_mode_enabled:
-            os.makedirs(screenshots_dir, exist_ok=True)
-            
-        monitor_id = str(monitor['_id'])
-        current_screenshot_path = os.path.join(screenshots_dir, f"{monitor_id}_current.png") if visual_mode_enabled else None
-        last_screenshot_path = os.path.join(screenshots_dir, f"{monitor_id}_last.png") if visual_mode_enabled else None
+    monitor_id = str(monitor['_id'])
+    current_screenshot_path = os.path.join(screenshots_dir, f"{monitor_id}_current.png") if visual_mode_enabled else None
+    last_screenshot_path = os.path.join(screenshots_dir, f"{monitor_id}_last.png") if visual_mode_enabled else None
 
+    # Only the browser work holds a concurrency slot; AI evaluation and notifications run outside it
+    async with semaphore:
         # Create an isolated browser context per monitor
         context = await browser.new_context(
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         )
         try:
             new_text = await scrape_monitor(context, monitor, monitors_col, screenshot_path=current_screenshot_path)
-            
+        
             # If we reach here and new_text is not None, the scrape was a success
             if new_text is not None:
                 monitors_col.update_one(
@@ -441,169 +1096,313 @@ async def process_monitor(monitor, browser, monitors_col, semaphore):
             # Catch severe, unhandled failures that bubble up
             error_msg = str(e)
             print(f"CRITICAL FAILURE scraping {monitor.get('url')}: {error_msg}")
-            
+        
             monitors_col.update_one(
                 {"_id": monitor["_id"]},
                 {"$set": {
                     "last_run_status": "failed",
                     "last_error": error_msg,
-                    "last_error_time": datetime.datetime.now()
-                }}
+                    "last_error_time": datetime.datetime.now(),
+                    **record_run_duration(monitor, time.monotonic() - run_started)
+                },
+                "$inc": {"consecutive_failures": 1}}
             )
             return
         finally:
             await context.close()
-            
-        if new_text is None:
-            # Means `scrape_monitor` caught the error internally and returned None
-            monitors_col.update_one(
-                {"_id": monitor["_id"]},
-                {"$set": {
-                    "last_run_status": "failed",
-                    "last_error": "Failed during internal page navigation or scraping details",
-                    "last_error_time": datetime.datetime.now()
-                }}
-            )
-            return
         
-        ai_focus_note = monitor.get('ai_focus_note', '')
-        trigger_mode_enabled = monitor.get('trigger_mode_enabled', False)
-        old_text = monitor.get('last_scraped_text', '')
+    if new_text is None:
+        # Means `scrape_monitor` caught the error internally and returned None
+        monitors_col.update_one(
+            {"_id": monitor["_id"]},
+            {"$set": {
+                "last_run_status": "failed",
+                "last_error": "Failed during internal page navigation or scraping details",
+                "last_error_time": datetime.datetime.now(),
+                **record_run_duration(monitor, time.monotonic() - run_started)
+            },
+            "$inc": {"consecutive_failures": 1}}
+        )
+        return
+    
+    ai_focus_note = monitor.get('ai_focus_note', '')
+    trigger_mode_enabled = monitor.get('trigger_mode_enabled', False)
+    old_text = monitor.get('last_scraped_text', '')
+
+    # Mask volatile content (timestamps, counters, tokens, learned lines) before any change detection
+    old_normalized = normalize_for_monitor(old_text, monitor)
+    new_normalized = normalize_for_monitor(new_text, monitor)
+    text_changed = has_meaningful_change(old_normalized, new_normalized)
+    is_significant = False
+
+    # Trigger conditions may depend on exactly the lines a monitor's custom or learned masks hide,
+    # so the trigger gate only applies the built-in rules (which never mask counters)
+    if trigger_mode_enabled:
+        use_builtin = monitor.get('normalization_enabled', True)
+        text_changed = has_meaningful_change(
+            normalize_text(old_text, use_builtin_rules=use_builtin),
+            normalize_text(new_text, use_builtin_rules=use_builtin)
+        )
 
-        if monitor.get('is_first_run'):
-            print(f"First run for {monitor['url']}. Saving base text.")
+    if monitor.get('is_first_run'):
+        print(f"First run for {monitor['url']}. Saving base text.")
+        
+        # For the first run, generate an initial baseline summary
+        summary = await summarize_changes("No previous content. This is the first time the page is being scanned.", new_text, ai_focus_note, trigger_mode_enabled, batch_key=monitor.get('user_email'))
+        
+        monitors_col.update_one(
+            {"_id": monitor["_id"]},
+            {
+                "$set": {
+                    "last_scraped_text": new_text,
+                    "latest_ai_summary": summary,
+                    "is_first_run": False,
+                    "last_updated_timestamp": datetime.datetime.now()
+                }
+            }
+        )
+        
+        # Handled first-run notifications
+        if trigger_mode_enabled and summary == "TRIGGER_NOT_MET":
+            # Send a setup confirmation email so the user knows the bot is actively waiting
+            setup_summary = f"🎯 **Sniper Bot Activated!**\n\nThe engine has successfully initialized and is now actively watching for your condition:\n*{ai_focus_note}*\n\nYou will NOT receive any further emails until this specific condition is strictly met."
+            await trigger_notifications(monitor, setup_summary, image_path=current_screenshot_path if visual_mode_enabled else None)
+        elif summary != "TRIGGER_NOT_MET":
+            await trigger_notifications(monitor, summary, image_path=current_screenshot_path if visual_mode_enabled else None)
             
-            # For the first run, generate an initial baseline summary
-            summary = await summarize_changes("No previous content. This is the first time the page is being scanned.", new_text, ai_focus_note, trigger_mode_enabled)
+        # Overwrite the old image baseline
+        if visual_mode_enabled and current_screenshot_path and os.path.exists(current_screenshot_path):
+            if os.path.exists(last_screenshot_path):
+                os.remove(last_screenshot_path)
+            os.rename(current_screenshot_path, last_screenshot_path)
+    else:
+        is_significant = False
+        visual_changed = False
+        ai_summary = None
+
+        # Handle Visual Screen Monitoring Mode
+        if visual_mode_enabled:
+            print(f"Evaluating Visual Output for {monitor['url']}")
             
+            # Compare the new screenshot against the old one
+            if os.path.exists(last_screenshot_path) and os.path.exists(current_screenshot_path):
+                percent_diff = compare_images(last_screenshot_path, current_screenshot_path)
+                print(f"Visual Diff Percentage: {percent_diff:.2f}%")
+                
+                if percent_diff > 1.0: # 1% threshold
+                    visual_changed = True
+                    is_significant = True
+                    ai_summary = f"📸 VISUAL CHANGE DETECTED: {percent_diff:.2f}% of the screen has changed."
+                    
+                    # Pass the fresh screenshot to Gemini for analysis!
+                    try:
+                        print(f"Requesting Gemini vision analysis for the visual diff...")
+                        ai_summary = await summarize_changes(
+                            old_text, 
+                            new_text, 
+                            ai_focus_note=ai_focus_note,
+                            trigger_mode_enabled=trigger_mode_enabled,
+                            image_path=current_screenshot_path,
+                            batch_key=monitor.get('user_email')
+                        )
+                    except Exception as e:
+                        print(f"Gemini Vision fallback error: {e}")
+                else:
+                    print(f"Visual diff too small ({percent_diff:.2f}%) for {monitor['url']}.")
+                    if current_screenshot_path and os.path.exists(current_screenshot_path):
+                        os.remove(current_screenshot_path) # Cleanup unused temp image
+
+
+        # Handle Sniper Trigger Mode
+        if trigger_mode_enabled and not is_significant and not text_changed and not visual_mode_enabled:
+            print(f"No meaningful text change for {monitor['url']}, skipping trigger evaluation.")
+        elif trigger_mode_enabled and not is_significant:
+            print(f"Evaluating Trigger Mode for {monitor['url']}")
+            # For trigger mode, we always summarize to check if the trigger condition is met
+            ai_summary = await summarize_changes(
+                old_text, 
+                new_text, 
+                ai_focus_note=ai_focus_note,
+                trigger_mode_enabled=True,
+                image_path=current_screenshot_path if (visual_mode_enabled and os.path.exists(current_screenshot_path)) else None,
+                batch_key=monitor.get('user_email')
+            )
+            if ai_summary != "TRIGGER_NOT_MET":
+                is_significant = True
+            else:
+                print(f"Sniper Trigger NOT met for {monitor['url']}.")
+
+        # Handle Standard Text Diffing
+        if not visual_changed and not trigger_mode_enabled and text_changed:
+            print(f"Changes detected on {monitor['url']}, requesting AI summary...")
+            # Normalization decides whether something changed; the AI sees the raw values of the changed lines
+            old_changed, new_changed = raw_changed_lines(old_text, new_text, monitor)
+            ai_summary = await summarize_changes(old_changed, new_changed, ai_focus_note, trigger_mode_enabled, batch_key=monitor.get('user_email'))
+            if "No significant changes" not in ai_summary:
+                is_significant = True
+        elif not visual_changed and not trigger_mode_enabled and old_text != new_text:
+            print(f"Only volatile content changed on {monitor['url']}, skipping AI summary.")
+
+        # Check if we should notify
+        if is_significant and ai_summary:
             monitors_col.update_one(
                 {"_id": monitor["_id"]},
                 {
                     "$set": {
                         "last_scraped_text": new_text,
-                        "latest_ai_summary": summary,
-                        "is_first_run": False,
+                        "latest_ai_summary": ai_summary,
                         "last_updated_timestamp": datetime.datetime.now()
                     }
                 }
             )
+            await trigger_notifications(monitor, ai_summary, image_path=current_screenshot_path if visual_mode_enabled else None)
             
-            # Handled first-run notifications
-            if trigger_mode_enabled and summary == "TRIGGER_NOT_MET":
-                # Send a setup confirmation email so the user knows the bot is actively waiting
-                setup_summary = f"🎯 **Sniper Bot Activated!**\n\nThe engine has successfully initialized and is now actively watching for your condition:\n*{ai_focus_note}*\n\nYou will NOT receive any further emails until this specific condition is strictly met."
-                await trigger_notifications(monitor, setup_summary, image_path=current_screenshot_path if visual_mode_enabled else None)
-            elif summary != "TRIGGER_NOT_MET":
-                await trigger_notifications(monitor, summary, image_path=current_screenshot_path if visual_mode_enabled else None)
-                
-            # Overwrite the old image baseline
-            if visual_mode_enabled and current_screenshot_path and os.path.exists(current_screenshot_path):
+            # Store new visual baseline if it was a visual change
+            if visual_mode_enabled and visual_changed:
                 if os.path.exists(last_screenshot_path):
                     os.remove(last_screenshot_path)
-                os.rename(current_screenshot_path, last_screenshot_path)
+                if os.path.exists(current_screenshot_path):
+                    os.rename(current_screenshot_path, last_screenshot_path)
         else:
-            is_significant = False
-            visual_changed = False
-            ai_summary = None
+            print(f"No significant updates for {monitor['url']}")
+            # Just update the timestamp
+            monitors_col.update_one(
+                {"_id": monitor["_id"]},
+                {"$set": {"last_updated_timestamp": datetime.datetime.now()}}
+            )
 
-            # Handle Visual Screen Monitoring Mode
-            if visual_mode_enabled:
-                print(f"Evaluating Visual Output for {monitor['url']}")
-                
-                # Compare the new screenshot against the old one
-                if os.path.exists(last_screenshot_path) and os.path.exists(current_screenshot_path):
-                    percent_diff = compare_images(last_screenshot_path, current_screenshot_path)
-                    print(f"Visual Diff Percentage: {percent_diff:.2f}%")
-                    
-                    if percent_diff > 1.0: # 1% threshold
-                        visual_changed = True
-                        is_significant = True
-                        ai_summary = f"📸 VISUAL CHANGE DETECTED: {percent_diff:.2f}% of the screen has changed."
-                        
-                        # Pass the fresh screenshot to Gemini for analysis!
-                        try:
-                            print(f"Requesting Gemini vision analysis for the visual diff...")
-                            ai_summary = await summarize_changes(
-                                old_text, 
-                                new_text, 
-                                ai_focus_note=ai_focus_note,
-                                trigger_mode_enabled=trigger_mode_enabled,
-                                image_path=current_screenshot_path
-                            )
-                        except Exception as e:
-                            print(f"Gemini Vision fallback error: {e}")
-                    else:
-                        print(f"Visual diff too small ({percent_diff:.2f}%) for {monitor['url']}.")
-                        if current_screenshot_path and os.path.exists(current_screenshot_path):
-                            os.remove(current_screenshot_path) # Cleanup unused temp image
-
-
-            # Handle Sniper Trigger Mode
-            if trigger_mode_enabled and not is_significant:
-                print(f"Evaluating Trigger Mode for {monitor['url']}")
-                # For trigger mode, we always summarize to check if the trigger condition is met
-                ai_summary = await summarize_changes(
-                    old_text, 
-                    new_text, 
-                    ai_focus_note=ai_focus_note,
-                    trigger_mode_enabled=True,
-                    image_path=current_screenshot_path if (visual_mode_enabled and os.path.exists(current_screenshot_path)) else None
-                )
-                if ai_summary != "TRIGGER_NOT_MET":
-                    is_significant = True
-                else:
-                    print(f"Sniper Trigger NOT met for {monitor['url']}.")
+    # Mark success and record the change observation for adaptive scheduling
+    monitors_col.update_one(
+        {"_id": monitor["_id"]},
+        {"$set": {
+            "last_run_status": "success",
+            "last_error": None,
+            "last_error_time": None,
+            "consecutive_failures": 0,
+            "consecutive_cancellations": 0,
+            "is_stuck": False,
+            **record_run_duration(monitor, time.monotonic() - run_started),
+            **update_adaptive_schedule(monitor, new_normalized),
+            # Track per-line flips between consecutive scrapes so volatile lines can be learned.
+            # Trigger monitors never learn: an unmet trigger is not evidence a line is noise.
+            **({} if trigger_mode_enabled else learn_volatile_lines(monitor, new_normalized, significant=is_significant))
+        }}
+    )
 
-            # Handle Standard Text Diffing
-            if not visual_changed and not trigger_mode_enabled and old_text != new_text:
-                print(f"Changes detected on {monitor['url']}, requesting AI summary...")
-                ai_summary = await summarize_changes(old_text, new_text, ai_focus_note, trigger_mode_enabled)
-                if "No significant changes" not in ai_summary:
-                    is_significant = True
+async def run_monitor_with_deadline(monitor, browser, monitors_col, semaphore):
+    """Runs a single check and records partial state if the run deadline cancels it."""
+    started = time.monotonic()
+    try:
+        await process_monitor(monitor, browser, monitors_col, semaphore)
+    except asyncio.CancelledError:
+        elapsed = time.monotonic() - started
+        cancellations = monitor.get('consecutive_cancellations', 0) + 1
+        print(f"Cancelled {monitor['url']} at the run deadline after {elapsed:.0f}s")
 
-            # Check if we should notify
-            if is_significant and ai_summary:
-                monitors_col.update_one(
-                    {"_id": monitor["_id"]},
-                    {
-                        "$set": {
-                            "last_scraped_text": new_text,
-                            "latest_ai_summary": ai_summary,
-                            "last_updated_timestamp": datetime.datetime.now()
-                        }
-                    }
-                )
-                await trigger_notifications(monitor, ai_summary, image_path=current_screenshot_path if visual_mode_enabled else None)
-                
-                # Store new visual baseline if it was a visual change
-                if visual_mode_enabled and visual_changed:
-                    if os.path.exists(last_screenshot_path):
-                        os.remove(last_screenshot_path)
-                    if os.path.exists(current_screenshot_path):
-                        os.rename(current_screenshot_path, last_screenshot_path)
-            else:
-                print(f"No significant updates for {monitor['url']}")
-                # Just update the timestamp
-                monitors_col.update_one(
-                    {"_id": monitor["_id"]},
-                    {"$set": {"last_updated_timestamp": datetime.datetime.now()}}
-                )
+        if cancellations >= MAX_CONSECUTIVE_CANCELLATIONS:
+            # Stop retrying a check that never fits the budget; editing the monitor clears this
+            status = "stuck"
+            error = f"Cancelled at the run deadline {cancellations} times in a row. Reduce the deep crawl depth or raise RUN_BUDGET_MINUTES."
+        else:
+            # The monitor stays overdue, so it is prioritized at the start of the next run
+            status = "cancelled"
+            error = "Run deadline reached before the check finished"
 
-        # Mark success 
         monitors_col.update_one(
             {"_id": monitor["_id"]},
             {"$set": {
-                "last_run_status": "success",
-                "last_error": None,
-                "last_error_time": None
+                "last_run_status": status,
+                "last_error": error,
+                "last_error_time": datetime.datetime.now(),
+                "consecutive_cancellations": cancellations,
+                "is_stuck": status == "stuck",
+                **record_run_duration(monitor, elapsed, partial=True)
             }}
         )
+        raise
+
+async def run_with_budget(monitors, browser, monitors_col, deadline):
+    """
+    Runs due monitors most-overdue first, starting each one only if its estimated cost fits
+    before the deadline. The most-overdue monitor always starts, so no monitor is deferred forever.
+    Anything still running at the deadline is cancelled.
+    """
+    due = [m for m in monitors if not m.get('is_paused', False) and is_monitor_due(m)]
+    for monitor in due:
+        if monitor.get('is_stuck'):
+            print(f"Skipping {monitor['url']} (Stuck: {monitor.get('last_error')})")
+    due = [m for m in due if not m.get('is_stuck')]
+    due.sort(key=lambda m: minutes_since_due(m)[0], reverse=True)
+
+    budget_seconds = max(deadline - time.monotonic(), 0)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_MONITORS)
+    running = set()
+    started = 0
+    skipped = 0
+
+    for monitor in due:
+        # Wait for a free browser slot, but never past the deadline.
+        # Checks busy with AI evaluation or notifications have already released theirs.
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            semaphore.release()
+        except asyncio.TimeoutError:
+            pass
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            skipped += len(due) - due.index(monitor)
+            break
+
+        # Capped at the whole budget, so a slow history can't rule a monitor out entirely
+        estimate = min(estimate_run_seconds(monitor), budget_seconds)
+        if estimate > remaining and started > 0:
+            print(f"Deferring {monitor['url']} (estimated {estimate:.0f}s, {remaining:.0f}s left in run budget)")
+            skipped += 1
+            continue
+
+        running.add(asyncio.create_task(run_monitor_with_deadline(monitor, browser, monitors_col, semaphore)))
+        started += 1
+        # Let the new check claim its slot before looking for the next one
+        await asyncio.sleep(0)
+
+    if running:
+        _, pending = await asyncio.wait(running, timeout=max(deadline - time.monotonic(), 0))
+        if pending:
+            print(f"Run deadline reached. Cancelling {len(pending)} in-flight checks.")
+            for task in pending:
+                task.cancel()
+            # Give cancelled checks a moment to close their browser contexts and record state
+            await asyncio.wait(pending, timeout=CANCEL_GRACE_SECONDS)
+
+    if skipped:
+        print(f"{skipped} due monitors deferred to the next run by the run budget")
+
+def count_due_monitors(monitors):
+    """
+    Counts monitors this run would check. Stuck monitors are skipped by the run budget,
+    so they must not keep the worker (and Playwright) alive either.
+    """
+    return sum(
+        1 for m in monitors
+        if not m.get('is_paused', False) and is_monitor_due(m)
+        and not (RUN_BUDGET_MINUTES > 0 and m.get('is_stuck'))
+    )
 
 async def run_worker():
+    global _ai_batcher
+    from pymongo import MongoClient
+
+    # Setup time before the script started and the cancellation grace period both count against the budget
+    setup_seconds = max(time.time() - RUN_STARTED_AT, 0) if RUN_STARTED_AT else 0
+    deadline = time.monotonic() + RUN_BUDGET_MINUTES * 60 - setup_seconds - CANCEL_GRACE_SECONDS
+
     client = MongoClient(MONGO_URI)
     try:
         db = client.get_database("thewebspider")
         monitors_col = db.monitors
+        # Incremental crawls upsert and look up stored pages by (monitor_id, url)
+        db.crawl_pages.create_index([("monitor_id", 1), ("url", 1)], unique=True)
         
         monitors = list(monitors_col.find({}))
         print(f"Found {len(monitors)} monitors to process")
@@ -611,11 +1410,25 @@ async def run_worker():
         if len(monitors) == 0:
             return
 
+        # Exit before loading Playwright or the AI SDK when nothing is due this run
+        due_count = count_due_monitors(monitors)
+        if due_count == 0:
+            print("No monitors are due this run. Exiting early.")
+            return
+
+        from playwright.async_api import async_playwright
+
+        # Pack small concurrent AI evaluations into shared Gemini requests during this run
+        _ai_batcher = GeminiBatcher() if AI_BATCH_SIZE > 1 else None
+
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=True)
             try:
-                # Limit concurrent browser tabs to 4 for github runner memory stability
-                semaphore = asyncio.Semaphore(4)
+                if RUN_BUDGET_MINUTES > 0:
+                    await run_with_budget(monitors, browser, monitors_col, deadline)
+                    return
+
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_MONITORS)
                 
                 # Create a task for each monitor
                 tasks = [
@@ -630,6 +1443,7 @@ async def run_worker():
     except Exception as e:
         print(f"Global Worker Exception: {e}")
     finally:
+        _ai_batcher = None
         client.close()
 
 if __name__ == "__main__":
@@ -31,10 +31,13 @@ const aiFocusLabel = document.getElementById('ai-focus-label');
 const aiFocusHelp = document.getElementById('ai-focus-help');
 const aiFocusNoteInput = document.getElementById('ai-focus-note');
 const visualModeCheck = document.getElementById('visual-mode');
+const ignorePatternsInput = document.getElementById('ignore-patterns');
+const maskLargeNumbersCheck = document.getElementById('mask-large-numbers');
 const customWebhookUrlInput = document.getElementById('custom-webhook-url');
 const deepCrawlCheck = document.getElementById('deep-crawl');
 const deepCrawlOptions = document.getElementById('deep-crawl-options');
 const deepCrawlDepthInput = document.getElementById('deep-crawl-depth');
+const incrementalCrawlCheck = document.getElementById('incremental-crawl');
 const deepCrawlAlert = document.getElementById('deep-crawl-alert');
 const requiresLoginCheck = document.getElementById('requires-login');
 const loginFields = document.getElementById('login-fields');
@@ -62,6 +65,10 @@ const passwordInput = document.getElementById('password');
 const captchaJsonInput = document.getElementById('captcha-json');
 const enableNotificationsCheck = document.getElementById('enable-notifications');
 const checkFrequencySelect = document.getElementById('check-frequency');
+const adaptiveFrequencyCheck = document.getElementById('adaptive-frequency');
+const adaptiveFrequencyFields = document.getElementById('adaptive-frequency-fields');
+const minCheckFrequencyInput = document.getElementById('min-check-frequency');
+const maxCheckFrequencyInput = document.getElementById('max-check-frequency');
 let editingMonitorId = null; // null = Add Mode, string = Edit Mode
 
 // Telegram State
@@ -214,16 +221,23 @@ function resetModalContent() {
 
     // Reset newly added inputs
     visualModeCheck.checked = false;
+    ignorePatternsInput.value = '';
+    maskLargeNumbersCheck.checked = false;
     customWebhookUrlInput.value = '';
     enableWebhooksCheck.checked = false;
     webhookFields.style.display = 'none';
     if (checkFrequencySelect) checkFrequencySelect.value = "1440";
+    adaptiveFrequencyCheck.checked = false;
+    adaptiveFrequencyFields.style.display = 'none';
+    minCheckFrequencyInput.value = '15';
+    maxCheckFrequencyInput.value = '10080';
 
     loginFields.style.display = 'none';
     captchaFields.style.display = 'none';
     telegramFields.style.display = 'none';
     deepCrawlOptions.style.display = 'none';
     deepCrawlAlert.style.display = 'none';
+    incrementalCrawlCheck.checked = false;
 
     if (telegramPollingInterval) clearInterval(telegramPollingInterval);
     telegramChatIdInput.value = '';
@@ -267,6 +281,13 @@ window.addEventListener('open-edit-modal', (e) => {
         checkFrequencySelect.value = "1440"; // Default
     }
 
+    if (monitor.adaptive_frequency_enabled) {
+        adaptiveFrequencyCheck.checked = true;
+        adaptiveFrequencyFields.style.display = 'block';
+    }
+    if (monitor.min_check_frequency) minCheckFrequencyInput.value = monitor.min_check_frequency;
+    if (monitor.max_check_frequency) maxCheckFrequencyInput.value = monitor.max_check_frequency;
+
     if (monitor.trigger_mode_enabled) {
         triggerModeCheck.checked = true;
         document.getElementById('ai-trigger-fields').style.display = 'block';
@@ -277,6 +298,8 @@ window.addEventListener('open-edit-modal', (e) => {
     if (monitor.ai_focus_note) aiFocusNoteInput.value = monitor.ai_focus_note;
 
     if (monitor.visual_mode_enabled) visualModeCheck.checked = true;
+    if (Array.isArray(monitor.ignore_patterns)) ignorePatternsInput.value = monitor.ignore_patterns.join('\n');
+    maskLargeNumbersCheck.checked = !!monitor.mask_large_numbers;
     if (monitor.custom_webhook_url) {
         enableWebhooksCheck.checked = true;
         customWebhookUrlInput.value = monitor.custom_webhook_url;
@@ -287,6 +310,7 @@ window.addEventListener('open-edit-modal', (e) => {
         deepCrawlCheck.checked = true;
         deepCrawlOptions.style.display = 'block';
         if (monitor.deep_crawl_depth) deepCrawlDepthInput.value = monitor.deep_crawl_depth;
+        incrementalCrawlCheck.checked = !!monitor.incremental_crawl_enabled;
     }
 
     if (monitor.requires_login) {
@@ -450,6 +474,10 @@ enableWebhooksCheck.addEventListener('change', (e) => {
     webhookFields.style.display = e.target.checked ? 'block' : 'none';
 });
 
+adaptiveFrequencyCheck.addEventListener('change', (e) => {
+    adaptiveFrequencyFields.style.display = e.target.checked ? 'block' : 'none';
+});
+
 // --- Form Submission ---
 addMonitorForm.addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -460,10 +488,16 @@ addMonitorForm.addEventListener('submit', async (e) => {
         ai_focus_note: aiFocusNoteInput ? aiFocusNoteInput.value.trim() : '',
         trigger_mode_enabled: triggerModeCheck.checked,
         visual_mode_enabled: visualModeCheck.checked,
+        ignore_patterns: ignorePatternsInput.value,
+        mask_large_numbers: maskLargeNumbersCheck.checked,
         custom_webhook_url: customWebhookUrlInput.value.trim(),
         deep_crawl: deepCrawlCheck.checked,
         deep_crawl_depth: deepCrawlDepthInput ? parseInt(deepCrawlDepthInput.value, 10) : 1,
+        incremental_crawl_enabled: incrementalCrawlCheck.checked,
         check_frequency: checkFrequencySelect ? parseInt(checkFrequencySelect.value, 10) : 1440,
+        adaptive_frequency_enabled: adaptiveFrequencyCheck.checked,
+        min_check_frequency: parseInt(minCheckFrequencyInput.value, 10),
+        max_check_frequency: parseInt(maxCheckFrequencyInput.value, 10),
         requires_login: requiresLoginCheck.checked,
         username: usernameInput.value,
         password: passwordInput.value,
@@ -548,9 +582,14 @@ async function loadAdminStats() {
         stats.monitors.forEach(monitor => {
             const tr = document.createElement('tr');
             const isPaused = monitor.is_paused;
-            const hasFailed = monitor.last_run_status === 'failed';
-
-            const statusBadge = hasFailed ? `<span class="text-danger">Failed</span>` : `<span style="color:var(--success)">Healthy</span>`;
+            // A stuck monitor is skipped until edited, so it counts as failed; a cancelled one retries next run
+            const hasFailed = monitor.last_run_status === 'failed' || monitor.last_run_status === 'stuck';
+            const wasCancelled = monitor.last_run_status === 'cancelled';
+
+            let statusBadge = `<span style="color:var(--success)">Healthy</span>`;
+            if (monitor.last_run_status === 'stuck') statusBadge = `<span class="text-danger">Stuck</span>`;
+            else if (hasFailed) statusBadge = `<span class="text-danger">Failed</span>`;
+            else if (wasCancelled) statusBadge = `<span class="text-warning">Cancelled</span>`;
             const pauseText = isPaused ? 'Resume' : 'Pause';
 
             tr.innerHTML = `
@@ -558,7 +597,7 @@ async function loadAdminStats() {
                 <td><a href="${monitor.url}" target="_blank" style="color:var(--primary); text-decoration:none;">${monitor.url.substring(0, 30)}...</a></td>
                 <td>${isPaused ? '<span class="text-warning">Paused</span>' : statusBadge}</td>
                 <td style="font-size:0.8rem; color:var(--text-secondary); max-width:200px; overflow:hidden; text-overflow:ellipsis; white-space:nowrap;" title="${monitor.last_error || ''}">
-                    ${hasFailed ? monitor.last_error : (monitor.last_error_time ? 'Recovered' : '-')}
+                    ${hasFailed || wasCancelled ? monitor.last_error : (monitor.last_error_time ? 'Recovered' : '-')}
                 </td>
                 <td>
                     <div style="display:flex; gap:4px;">
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import types
+import scraper
+
+class FakeModels:
+    def __init__(self):
+        self.batches = []
+
+    def generate_content(self, model, contents, config=None):
+        items = json.loads(contents[0].split("ITEMS:\n")[1])
+        self.batches.append(items)
+        assert config["response_schema"] == scraper.BATCH_RESPONSE_SCHEMA
+        # Answer every item except the last one to exercise the per-item fallback
+        return types.SimpleNamespace(text=json.dumps([{"id": item["id"], "result": f"- {item['diff']}"} for item in items[:-1]]))
+
+def run_batch(monkeypatch, submissions, max_batch_size=3):
+    models = FakeModels()
+    monkeypatch.setattr(scraper, "get_ai_client", lambda: types.SimpleNamespace(models=models))
+
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        # Skip the rate-limit pause before the Gemini call
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+
+    async def main():
+        batcher = scraper.GeminiBatcher(max_batch_size=max_batch_size, window_seconds=0)
+        results = await asyncio.gather(*(batcher.submit(key, {"type": "diff", "focus_note": "", "diff": diff}) for key, diff in submissions))
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    return models, batcher, results
+
+def test_batches_never_mix_users(monkeypatch):
+    models, _, results = run_batch(monkeypatch, [("a@x.com", "a1"), ("b@x.com", "b1"), ("a@x.com", "a2"), ("b@x.com", "b2")])
+    assert sorted(sorted(item["diff"] for item in batch) for batch in models.batches) == [["a1", "a2"], ["b1", "b2"]]
+    # The unanswered item of each batch falls back to a single call
+    assert results == ["- a1", "- b1", None, None]
+
+def test_lone_item_skips_batching(monkeypatch):
+    models, _, results = run_batch(monkeypatch, [("a@x.com", "only")])
+    assert models.batches == [] and results == [None]
+
+def test_flush_tasks_are_tracked_until_done(monkeypatch):
+    _, batcher, results = run_batch(monkeypatch, [("a@x.com", "a1"), ("a@x.com", "a2"), ("a@x.com", "a3")])
+    assert results == ["- a1", "- a2", None]
+    assert batcher.flush_tasks == set() and batcher.timers == {} and batcher.pending == {}
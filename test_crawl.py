@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import datetime
+from scraper import load_crawl_frontier, merge_crawl_frontier, select_urls_to_refresh, FRONTIER_MAX_MISSED_RUNS
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0)
+ROOT = "https://a.com/"
+
+def make_frontier(*urls, missed=0):
+    return {url: {"url": url, "depth": 2, "lastmod": None, "missed_runs": missed} for url in urls}
+
+def test_unseen_page_is_dropped_after_max_missed_runs():
+    frontier = make_frontier("https://a.com/gone", "https://a.com/linked", "https://a.com/listed")
+    for run in range(FRONTIER_MAX_MISSED_RUNS):
+        entries, dropped = merge_crawl_frontier(
+            frontier, {ROOT}, {"https://a.com/linked"}, {"https://a.com/listed": None}, {ROOT: 1}, 3, NOW
+        )
+        frontier = {entry["url"]: entry for entry in entries}
+    assert dropped == ["https://a.com/gone"]
+    assert set(frontier) == {ROOT, "https://a.com/linked", "https://a.com/listed"}
+
+def test_rendered_page_resets_missed_runs_and_has_no_text():
+    frontier = make_frontier("https://a.com/x", missed=5)
+    entries, dropped = merge_crawl_frontier(frontier, {"https://a.com/x"}, set(), {}, {}, 3, NOW)
+    assert dropped == []
+    assert entries[0]["missed_runs"] == 0 and "text" not in entries[0]
+
+def test_refresh_picks_changed_lastmod_and_rotates_sample():
+    frontier = make_frontier(*[f"https://a.com/{c}" for c in "abcdefghij"])
+    frontier["https://a.com/j"]["lastmod"] = "2024-01"
+    refresh, cursor = select_urls_to_refresh(frontier, {"https://a.com/j": "2024-02"}, ROOT, 0)
+    assert refresh == {"https://a.com/j", "https://a.com/a"}
+    refresh, cursor = select_urls_to_refresh(frontier, {"https://a.com/j": "2024-02"}, ROOT, cursor)
+    assert "https://a.com/b" in refresh
+
+def test_frontier_from_another_host_is_ignored():
+    monitor = {"crawl_frontier": [
+        {"url": "https://old.com/page", "depth": 2},
+        {"url": "https://a.com/page", "depth": 2},
+        {"url": "https://a.com/deep", "depth": 4},
+    ]}
+    assert set(load_crawl_frontier(monitor, ROOT, 3)) == {"https://a.com/page"}
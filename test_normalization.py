@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from scraper import normalize_text, raw_changed_lines, normalize_for_monitor, has_meaningful_change, learn_volatile_lines, VOLATILE_LEARN_THRESHOLD
+
+def test_masks_dates_times_and_tokens():
+    text = "Updated 2024-05-01T10:00:00Z at 10:00 PM\nPosted 5 minutes ago\nid 123e4567-e89b-12d3-a456-426614174000\nOn 05/01/2024"
+    assert normalize_text(text) == "Updated [DATE] at [TIME]\nPosted [RELATIVE_TIME]\nid [UUID]\nOn [DATE]"
+
+def test_keeps_versions_prices_and_stock():
+    text = "Version 10.11.12\nPrice: 1,299 EGP\nTotal USD 12,500\nStock: 15000 units\nScore 2:1"
+    assert normalize_text(text) == text
+
+def test_counters_are_opt_in_and_skip_currency():
+    text = "Views: 12,345\nPrice: 1,299 EGP\nTotal $ 25,000"
+    assert normalize_text(text) == text
+    assert normalize_text(text, mask_numbers=True) == "Views: [NUMBER]\nPrice: 1,299 EGP\nTotal $ 25,000"
+
+def test_custom_rules_and_invalid_patterns():
+    monitor = {"url": "x", "ignore_patterns": "Ad: .*\n(unclosed"}
+    assert normalize_for_monitor("Ad: buy shoes\nNews", monitor) == "[VOLATILE]\nNews"
+
+def run_learning(monitor, texts, significant=False):
+    for text in texts:
+        monitor.update(learn_volatile_lines(monitor, normalize_for_monitor(text, monitor), significant))
+
+def test_learns_line_that_flips_every_run():
+    monitor = {"url": "x"}
+    run_learning(monitor, [f"Header\nOnline now: {n}\nFooter" for n in range(VOLATILE_LEARN_THRESHOLD + 1)])
+    old = normalize_for_monitor("Header\nOnline now: 1\nFooter", monitor)
+    new = normalize_for_monitor("Header\nOnline now: 99\nFooter", monitor)
+    assert new == "Header\n[VOLATILE]\nFooter"
+    assert not has_meaningful_change(old, new)
+
+def test_one_off_change_is_not_learned():
+    monitor = {"url": "x"}
+    # Changed once, then stable: compared run to run, not against a stale baseline
+    run_learning(monitor, ["Items left 10", "Items left 12", "Items left 12", "Items left 12", "Items left 12"])
+    assert monitor["learned_volatile_shapes"] == []
+    assert has_meaningful_change(normalize_for_monitor("Items left 12", monitor), normalize_for_monitor("Items left 99", monitor))
+
+def test_significant_change_resets_counts():
+    monitor = {"url": "x"}
+    run_learning(monitor, ["Count 1", "Count 2"])
+    run_learning(monitor, ["Count 3"], significant=True)
+    run_learning(monitor, ["Count 4"])
+    assert monitor["learned_volatile_shapes"] == []
+
+def test_currency_lines_are_never_learned():
+    monitor = {"url": "x"}
+    run_learning(monitor, [f"Price {n} EGP" for n in range(VOLATILE_LEARN_THRESHOLD + 2)])
+    assert monitor["learned_volatile_shapes"] == []
+
+def test_learned_shape_only_masks_matching_lines():
+    monitor = {"url": "x"}
+    run_learning(monitor, [f"Header\nVisitors {n}\nHeader\nB" for n in range(VOLATILE_LEARN_THRESHOLD + 1)])
+    assert normalize_for_monitor("Header\nVisitors 7\nHeader\nB", monitor) == "Header\n[VOLATILE]\nHeader\nB"
+
+def test_ai_sees_raw_values_of_changed_lines_only():
+    old = "Header\nUpdated 2024-05-01\nEvent on 05/01/2024"
+    new = "Header\nUpdated 2024-05-02\nEvent on 06/01/2024 in Cairo"
+    assert raw_changed_lines(old, new, {"url": "x"}) == ("Event on 05/01/2024", "Event on 06/01/2024 in Cairo")
+
+def test_volatile_only_changes_produce_no_raw_diff():
+    assert raw_changed_lines("Seen 5 minutes ago", "Seen 7 minutes ago", {"url": "x"}) == ("", "")
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import time
+import scraper
+
+class FakeCollection:
+    def __init__(self):
+        self.updates = []
+
+    def update_one(self, query, update):
+        self.updates.append((query["_id"], update["$set"]))
+
+def make_monitor(_id, overdue_minutes, **fields):
+    monitor = {
+        "_id": _id,
+        "url": f"https://example.com/{_id}",
+        "check_frequency": 60,
+        "last_updated_timestamp": datetime.datetime.now() - datetime.timedelta(minutes=60 + overdue_minutes)
+    }
+    monitor.update(fields)
+    return monitor
+
+def run_budget(monkeypatch, monitors, budget_seconds, durations):
+    started = []
+
+    async def fake_process_monitor(monitor, browser, monitors_col, semaphore):
+        started.append(monitor["_id"])
+        await asyncio.sleep(durations.get(monitor["_id"], 0))
+
+    monkeypatch.setattr(scraper, "process_monitor", fake_process_monitor)
+    monkeypatch.setattr(scraper, "CANCEL_GRACE_SECONDS", 1)
+    col = FakeCollection()
+    asyncio.run(scraper.run_with_budget(monitors, None, col, time.monotonic() + budget_seconds))
+    return started, col
+
+def test_most_overdue_slow_monitor_still_starts(monkeypatch):
+    monitors = [make_monitor("slow", 30 * 24 * 60, avg_run_seconds=800), make_monitor("fast", 10, avg_run_seconds=0.01)]
+    started, _ = run_budget(monkeypatch, monitors, 0.5, {})
+    assert started[0] == "slow"
+
+def test_repeated_cancellations_mark_monitor_stuck(monkeypatch):
+    monitor = make_monitor("hang", 10, consecutive_cancellations=scraper.MAX_CONSECUTIVE_CANCELLATIONS - 1)
+    _, col = run_budget(monkeypatch, [monitor], 0.1, {"hang": 5})
+    _, fields = col.updates[-1]
+    assert fields["last_run_status"] == "stuck" and fields["is_stuck"] is True
+
+def test_stuck_monitor_is_skipped(monkeypatch):
+    started, _ = run_budget(monkeypatch, [make_monitor("stuck", 10, is_stuck=True)], 0.5, {})
+    assert started == []
+
+def test_stuck_monitor_does_not_count_as_due(monkeypatch):
+    monitors = [make_monitor("stuck", 10, is_stuck=True)]
+    monkeypatch.setattr(scraper, "RUN_BUDGET_MINUTES", 13)
+    assert scraper.count_due_monitors(monitors) == 0
+    monkeypatch.setattr(scraper, "RUN_BUDGET_MINUTES", 0)
+    assert scraper.count_due_monitors(monitors) == 1
+
+def test_checks_waiting_on_ai_do_not_hold_slots(monkeypatch):
+    in_ai_step = []
+
+    async def fake_process_monitor(monitor, browser, monitors_col, semaphore):
+        async with semaphore:
+            await asyncio.sleep(0.01)
+        in_ai_step.append(monitor["_id"])
+        await asyncio.sleep(0.3)
+
+    monkeypatch.setattr(scraper, "process_monitor", fake_process_monitor)
+    monitors = [make_monitor(n, 10, avg_run_seconds=0.01) for n in range(scraper.MAX_CONCURRENT_MONITORS * 2)]
+    asyncio.run(scraper.run_with_budget(monitors, None, FakeCollection(), time.monotonic() + 0.2))
+    # Every check reached the AI step together instead of waiting for earlier ones to finish it
+    assert len(in_ai_step) == len(monitors)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import datetime
+from scraper import get_effective_frequency, is_monitor_due, minutes_since_due, update_adaptive_schedule
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0)
+
+def make_monitor(**fields):
+    monitor = {"url": "x", "check_frequency": 60, "last_updated_timestamp": NOW - datetime.timedelta(minutes=60)}
+    monitor.update(fields)
+    return monitor
+
+def test_fixed_frequency_due_with_grace_period():
+    assert is_monitor_due(make_monitor(last_updated_timestamp=NOW - datetime.timedelta(minutes=56)), NOW)
+    assert not is_monitor_due(make_monitor(last_updated_timestamp=NOW - datetime.timedelta(minutes=50)), NOW)
+    assert is_monitor_due(make_monitor(last_updated_timestamp=None), NOW)
+
+def test_first_observation_keeps_configured_interval():
+    monitor = make_monitor(adaptive_frequency_enabled=True)
+    monitor.update(update_adaptive_schedule(monitor, "text", NOW))
+    assert "adaptive_interval" not in monitor
+    monitor.update(update_adaptive_schedule(monitor, "text", NOW))
+    # One unchanged check stretches the interval modestly
+    assert 60 < monitor["adaptive_interval"] < 120
+
+def test_unchanged_page_stretches_interval_within_bounds():
+    monitor = make_monitor(adaptive_frequency_enabled=True, max_check_frequency=600, last_content_hash="seed")
+    for _ in range(30):
+        monitor.update(update_adaptive_schedule(monitor, "same text", NOW))
+        monitor["last_updated_timestamp"] = NOW - datetime.timedelta(minutes=monitor["adaptive_interval"])
+    assert monitor["adaptive_interval"] == 600
+
+def test_frequent_changes_shrink_interval_to_minimum():
+    monitor = make_monitor(adaptive_frequency_enabled=True, min_check_frequency=30, last_content_hash="seed")
+    for n in range(30):
+        monitor.update(update_adaptive_schedule(monitor, f"version {n}", NOW))
+        monitor["last_updated_timestamp"] = NOW - datetime.timedelta(minutes=monitor["adaptive_interval"])
+    assert monitor["adaptive_interval"] == 30
+
+def test_non_adaptive_monitor_only_records_hash():
+    fields = update_adaptive_schedule(make_monitor(), "text", NOW)
+    assert set(fields) == {"last_content_hash"}
+
+def test_failure_backoff_starts_from_normal_interval():
+    monitor = make_monitor(check_frequency=1440, adaptive_frequency_enabled=True, consecutive_failures=1)
+    assert get_effective_frequency(monitor) == 1440
+    monitor["consecutive_failures"] = 3
+    assert get_effective_frequency(monitor) == 5760
+    monitor["consecutive_failures"] = 10
+    assert get_effective_frequency(monitor) == 10080
+
+def test_failing_monitor_due_from_last_error():
+    monitor = make_monitor(
+        adaptive_frequency_enabled=True,
+        consecutive_failures=2,
+        last_updated_timestamp=NOW - datetime.timedelta(days=1),
+        last_error_time=NOW - datetime.timedelta(minutes=60)
+    )
+    assert not is_monitor_due(monitor, NOW)
+    overdue, frequency, _ = minutes_since_due(monitor, NOW)
+    assert frequency == 120 and overdue == -60